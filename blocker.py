@@ -1,13 +1,18 @@
 
+import errno
+import os
 import sys
 import argparse
 import logging
 from datetime import datetime, timedelta
-import subprocess
 import platform
 from pathlib import Path
 import asyncio
+import functools
+import itertools
 import signal
+import shutil
+import tempfile
 from typing import Set, List
 import re
 
@@ -18,26 +23,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_DOMAIN_RE = re.compile(r'^(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}$')
+_MAX_DOMAIN_LEN = 253
+_DURATION_RE = re.compile(r'^(\d+)([smhd])?$')
+_UNIT_SECONDS = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+    None: 60  # Default to minutes if no unit specified
+}
+
+_SYSTEM = platform.system()
+_IS_WINDOWS = _SYSTEM == "Windows"
+_IS_DARWIN = _SYSTEM == "Darwin"
+
+if _IS_WINDOWS:
+    _FLUSH_CMDS = ["ipconfig /flushdns"]
+    _FLUSH_FALLBACK_CMDS = []
+elif _IS_DARWIN:  # macOS
+    _FLUSH_CMDS = ["dscacheutil -flushcache", "killall -HUP mDNSResponder"]
+    _FLUSH_FALLBACK_CMDS = []
+else:  # Linux
+    _FLUSH_CMDS = ["sudo systemctl restart systemd-resolved"]
+    _FLUSH_FALLBACK_CMDS = ["sudo service network-manager restart"]
+
 def check_admin() -> bool:
     """Check if the script has administrative privileges."""
     try:
-        if platform.system() == "Windows":
-            return subprocess.run("net session", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).returncode == 0
-        return subprocess.run(["sudo", "-n", "true"], stdout=subprocess.PIPE, stderr=subprocess.PIPE).returncode == 0
+        if _IS_WINDOWS:
+            import ctypes
+            return ctypes.windll.shell32.IsUserAnAdmin() != 0
+        return os.geteuid() == 0
     except:
         return False
 
 def get_admin_command() -> str:
     """Return the appropriate admin command based on the OS."""
-    if platform.system() == "Windows":
+    if _IS_WINDOWS:
         return "runas /user:Administrator "
     return "sudo "
 
 class WebsiteBlocker:
     def __init__(self):
-        self.HOSTS_PATH = Path("/etc/hosts" if platform.system() != "Windows" else r"C:\Windows\System32\drivers\etc\hosts")
+        self.HOSTS_PATH = Path("/etc/hosts" if not _IS_WINDOWS else r"C:\Windows\System32\drivers\etc\hosts")
         self.LOCALHOST = "127.0.0.1"
         self.BLOCK_MARKER = "# Website blocks added by blocker script"
+        self._cleaned = False
+        self._cleanup_lock = asyncio.Lock()
+        self._cleanup_task = None
+        self._wait = None
         self._validate_hosts_path()
 
     def _validate_hosts_path(self) -> None:
@@ -48,86 +83,157 @@ class WebsiteBlocker:
             raise ValueError(f"Hosts path {self.HOSTS_PATH} is not a regular file")
 
     @staticmethod
+    @functools.lru_cache(maxsize=4096)
     def is_valid_domain(domain: str) -> bool:
         """Validate domain name format."""
-        pattern = r'^(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}$'
-        return bool(re.match(pattern, domain))
+        if len(domain) > _MAX_DOMAIN_LEN:
+            return False
+        return bool(_DOMAIN_RE.match(domain))
 
     def expand_domains(self, domains: Set[str]) -> Set[str]:
         """Add www. variant for each domain if not present."""
-        expanded = set()
-        for domain in domains:
-            if not self.is_valid_domain(domain):
-                logger.warning(f"Skipping invalid domain: {domain}")
-                continue
-            expanded.add(domain)
-            if not domain.startswith('www.'):
-                expanded.add('www.' + domain)
-        return expanded
+        valid = {domain for domain in domains if self.is_valid_domain(domain)}
+        invalid = domains - valid
+        if invalid:
+            logger.warning(f"Skipping invalid domains: {', '.join(sorted(invalid))}")
+        return valid | {'www.' + domain for domain in valid if not domain.startswith('www.')}
+
+    @staticmethod
+    async def _run_commands(cmds: List[str]) -> List[int]:
+        """Run shell commands concurrently and return their exit codes."""
+        procs = await asyncio.gather(*(
+            asyncio.create_subprocess_shell(
+                cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+            for cmd in cmds))
+        return await asyncio.gather(*(proc.wait() for proc in procs))
 
     async def flush_dns_cache(self) -> None:
         """Flush DNS cache asynchronously with better error handling."""
         try:
-            if platform.system() == "Windows":
-                await asyncio.create_subprocess_shell("ipconfig /flushdns")
-            elif platform.system() == "Darwin":  # macOS
-                await asyncio.create_subprocess_shell("dscacheutil -flushcache")
-                await asyncio.create_subprocess_shell("killall -HUP mDNSResponder")
-            else:  # Linux
-                try:
-                    await asyncio.create_subprocess_shell("sudo systemctl restart systemd-resolved")
-                except:
-                    await asyncio.create_subprocess_shell("sudo service network-manager restart")
-            
+            try:
+                codes = await self._run_commands(_FLUSH_CMDS)
+            except OSError:
+                if not _FLUSH_FALLBACK_CMDS:
+                    raise
+                codes = await self._run_commands(_FLUSH_FALLBACK_CMDS)
+            if any(codes):
+                raise RuntimeError(f"flush command exited with status {next(c for c in codes if c)}")
+
             logger.info("DNS cache flushed successfully")
         except Exception as e:
             logger.warning(f"Could not flush DNS cache: {e}")
             logger.info("You may need to restart your browser for changes to take effect")
 
+    @staticmethod
+    def _write_all(fd: int, buf: bytes) -> None:
+        """Write the whole buffer to fd, retrying short writes, then fsync."""
+        view = memoryview(buf)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+
+    def _write_hosts(self, buf: bytes) -> None:
+        """Atomically replace the hosts file with a single write."""
+        # Write through symlinks so a managed /etc/hosts stays linked
+        target = self.HOSTS_PATH.resolve()
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix='.tmp')
+        try:
+            try:
+                self._write_all(fd, buf)
+            finally:
+                os.close(fd)
+            shutil.copymode(target, tmp)
+            try:
+                os.replace(tmp, target)
+            except OSError as e:
+                # Bind-mounted hosts files (e.g. in containers) cannot be renamed over
+                if e.errno not in (errno.EBUSY, errno.EXDEV):
+                    raise
+                fd = os.open(target, os.O_WRONLY | os.O_TRUNC | getattr(os, 'O_BINARY', 0))
+                try:
+                    self._write_all(fd, buf)
+                finally:
+                    os.close(fd)
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
     async def modify_hosts_file(self, domains: Set[str], add_blocks: bool = True) -> None:
         """Modify hosts file to add or remove domain blocks."""
         try:
-            hosts_content = self.HOSTS_PATH.read_text().splitlines()
-            
-            # Remove existing blocks
-            hosts_content = [line for line in hosts_content 
-                           if not any(domain in line for domain in domains) 
-                           and self.BLOCK_MARKER not in line]
+            marker = self.BLOCK_MARKER.encode()
+            localhost = self.LOCALHOST.encode()
+            blocked = {domain.encode() for domain in domains}
+
+            # Remove existing blocks while streaming the file, keeping the
+            # dropped lines so an unchanged file can be detected without a re-read
+            out = bytearray()
+            dropped = bytearray()
+            dropped_at_tail = True
+            with open(self.HOSTS_PATH, 'rb') as f:
+                # Match the file's existing line endings (CRLF on Windows)
+                first = f.readline()
+                newline = b'\r\n' if first.endswith(b'\r\n') else b'\n' if first else os.linesep.encode()
+                for raw in itertools.chain((first,), f):
+                    if marker in raw:
+                        dropped += raw
+                        continue
+                    parts = raw.split()
+                    if len(parts) >= 2 and parts[0] == localhost and parts[1] in blocked:
+                        dropped += raw
+                        continue
+                    if dropped:
+                        dropped_at_tail = False
+                    out += raw
+            newline_added = bool(out) and not out.endswith(b'\n')
+            if newline_added:
+                out += newline
 
+            block = b''
             if add_blocks:
-                hosts_content.append(self.BLOCK_MARKER)
-                for domain in domains:
-                    hosts_content.append(f"{self.LOCALHOST} {domain}")
+                eol = newline.decode()
+                entries = eol.join(f"{self.LOCALHOST} {domain}" for domain in sorted(domains))
+                block = f"{self.BLOCK_MARKER}{eol}{entries}{eol}".encode()
+                out += block
 
-            self.HOSTS_PATH.write_text('\n'.join(hosts_content) + '\n')
+            # Nothing to write or flush if we would put back exactly what we removed
+            if not newline_added and dropped_at_tail and dropped == block:
+                logger.debug("Hosts file unchanged, skipping write")
+                return
+
+            self._write_hosts(out)
             await self.flush_dns_cache()
-            
+
         except Exception as e:
             logger.error(f"Error modifying hosts file: {e}")
             raise
 
-    async def block_websites(self, websites: List[str], duration: float) -> None:
-        """Block specified websites for a given duration."""
+    async def block_websites(self, websites: List[str], duration: int) -> None:
+        """Block specified websites for a given duration in seconds."""
         if not check_admin():
             raise PermissionError("Administrative privileges required")
 
-        domains = self.expand_domains(set(websites))
-        end_time = datetime.now() + timedelta(minutes=duration)
+        domains = frozenset(self.expand_domains(set(websites)))
+        end_time = datetime.now() + timedelta(seconds=duration)
         
         try:
             # Set up signal handlers
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
+            self._wait = fut = loop.create_future()
+            handler = functools.partial(self._on_signal, domains)
             for sig in (signal.SIGINT, signal.SIGTERM):
-                loop.add_signal_handler(sig, lambda s=sig: asyncio.create_task(self.cleanup(domains, s)))
+                loop.add_signal_handler(sig, handler, sig)
 
             logger.info(f"Blocking {len(domains)} domains until {end_time.strftime('%H:%M:%S')}")
             await self.modify_hosts_file(domains, add_blocks=True)
             
+            handle = loop.call_later(duration, fut.set_result, None)
             try:
-                await asyncio.sleep(duration * 60)
+                await fut
             except asyncio.CancelledError:
                 logger.info("Blocking interrupted by user")
-            
+            finally:
+                handle.cancel()
+
             await self.cleanup(domains)
 
         except Exception as e:
@@ -135,24 +241,44 @@ class WebsiteBlocker:
             await self.cleanup(domains)
             raise
 
+    def _on_signal(self, domains: Set[str], sig: signal.Signals) -> None:
+        """Schedule cleanup when a termination signal arrives."""
+        if self._cleanup_task is not None and not self._cleanup_task.done():
+            return
+        self._cleanup_task = asyncio.create_task(self.cleanup(domains, sig))
+        self._cleanup_task.add_done_callback(self._on_cleanup_done)
+
+    @staticmethod
+    def _on_cleanup_done(task: asyncio.Task) -> None:
+        """Report a failed signal-triggered cleanup."""
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Cleanup after signal failed: {task.exception()}")
+
     async def cleanup(self, domains: Set[str], sig = None) -> None:
         """Clean up blocks and handle program termination."""
-        if sig:
-            logger.info(f"Received signal {sig.name}, cleaning up...")
-        
-        await self.modify_hosts_file(domains, add_blocks=False)
-        logger.info("Websites unblocked")
-
-def parse_duration(time_str: str) -> float:
-    """Parse time string with improved validation and error handling."""
-    units = {
-        's': 1/60,
-        'm': 1,
-        'h': 60,
-        'd': 1440
-    }
-    
-    match = re.match(r'^(\d+)([smhd])?$', time_str.lower())
+        async with self._cleanup_lock:
+            if self._cleaned:
+                return
+
+            if sig:
+                logger.info(f"Received signal {sig.name}, cleaning up...")
+
+            try:
+                await self.modify_hosts_file(domains, add_blocks=False)
+                self._cleaned = True
+                logger.info("Websites unblocked")
+            except Exception as e:
+                # Hand the error to the waiting block so it retries and reports it
+                if self._wait is not None and not self._wait.done():
+                    self._wait.set_exception(e)
+                raise
+            finally:
+                if self._wait is not None and not self._wait.done():
+                    self._wait.cancel()
+
+def parse_duration(time_str: str) -> int:
+    """Parse time string into a number of seconds."""
+    match = _DURATION_RE.match(time_str.lower())
     if not match:
         raise ValueError(
             "Invalid time format. Use: \n"
@@ -161,7 +287,7 @@ def parse_duration(time_str: str) -> float:
         )
     
     number, unit = match.groups()
-    return int(number) * units.get(unit, 1)  # Default to minutes if no unit specified
+    return int(number) * _UNIT_SECONDS[unit]
 
 async def main():
     parser = argparse.ArgumentParser(
@@ -181,8 +307,9 @@ async def main():
         logger.setLevel(logging.DEBUG)
 
     try:
-        websites = [line.strip() for line in args.file.read_text().splitlines() 
-                   if line.strip() and not line.startswith('#')]
+        with args.file.open('r', buffering=65536) as f:
+            websites = [site for line in f for site in (line.strip(),)
+                        if site and not site.startswith('#')]
         duration = parse_duration(args.time)
         
         blocker = WebsiteBlocker()